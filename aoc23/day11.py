@@ -1,51 +1,38 @@
 import math
 import numpy as np
-from itertools import combinations
 
 
 def compute_sum_distances(puzzle_input, factor):
-    # Array size
-    n_rows = len(puzzle_input)
-    n_cols = len(puzzle_input[0])
-
-    # Track the empty rows/columns - initialise lists
-    col_tracker = n_cols * [1]
-    row_tracker = n_rows * [0]
-
-    # Also record the locations of the galaxies
-    galaxy_locs = []
-
-    for row in range(n_rows):
-        is_row_empty = 1
-        for col, val in enumerate(puzzle_input[row]):
-            if val == "#":
-                # Record galaxy location
-                galaxy_locs.append((row, col))
-
-                # Update column tracker
-                col_tracker[col] = 0
-
-                is_row_empty = 0
-
-        # Update column tracker
-        row_tracker[row] = is_row_empty
-
-    # Cumulative empty row trackers
-    row_cumsum = np.cumsum(row_tracker)
-    col_cumsum = np.cumsum(col_tracker)
-
-    sum_distances = 0
-    for (i1, j1), (i2, j2) in combinations(galaxy_locs, 2):
-        # Number of empty rows/columns between these two galaxies
-        row_expansion = row_cumsum[i2] - row_cumsum[i1]
-        col_expansion = col_cumsum[j2] - col_cumsum[j1]
-
-        # Taxicab + expansion metric
-        distance = np.abs(i2 - i1 + (factor - 1) * row_expansion) + np.abs(
-            j2 - j1 + (factor - 1) * col_expansion
-        )
-
-        # Convert back to native int, to avoid overflow errors with np.int32
-        sum_distances += int(distance)
-
-    return sum_distances
+    return compute_sum_distances_factors(puzzle_input, [factor])[0]
+
+
+def _axis_distance_sums(counts: np.ndarray) -> tuple[int]:
+    # Sum of pairwise distances along one axis, split into the unexpanded
+    # part and the part that scales with (factor - 1). Crossing from line k
+    # to line k + 1 adds 1 (or factor, if line k + 1 is empty) to the
+    # distance of every pair with one galaxy on each side: there are
+    # below * (n_galaxies - below) such pairs
+    n_galaxies = int(counts.sum())
+    below = np.cumsum(counts)[:-1].astype(np.int64)
+    crossing_pairs = below * (n_galaxies - below)
+
+    is_empty = counts[1:] == 0
+    return int(crossing_pairs.sum()), int(crossing_pairs[is_empty].sum())
+
+
+def compute_sum_distances_factors(
+    puzzle_input: list[str], factors: list[int]
+) -> list[int]:
+    # Sum of distances between all pairs of galaxies, for each expansion
+    # factor, in O(rows + cols) after counting the galaxies in each line
+    grid = np.array([list(row) for row in puzzle_input]) == "#"
+    row_counts = grid.sum(axis=1)
+    col_counts = grid.sum(axis=0)
+
+    row_base, row_expansion = _axis_distance_sums(row_counts)
+    col_base, col_expansion = _axis_distance_sums(col_counts)
+
+    return [
+        row_base + col_base + (factor - 1) * (row_expansion + col_expansion)
+        for factor in factors
+    ]
@@ -1,63 +1,115 @@
-from functools import cache
-
-
-@cache
-def num_possible_arrays(string: str, nums: str, base_level=True) -> int:
-    num = 0
+def num_possible_arrays(string: str, nums: str) -> int:
     # Split the nums into a list of ints
-    # Use of a string argument `nums` to allow caching
     nums = [int(x) for x in nums.split(",")] if nums else []
+    return count_arrangements(string, nums)
 
-    # End of a recursion - empty contiguous integer list
-    # So return 1 if there are no further `#` characters
-    # in remaining string (valid solution), and return 0
-    # if there are `#` characters (invalid solution)
-    if nums == []:
-        return not any([c == "#" for c in string])
 
-    # The ends of the string can be fiddly to deal with.
-    # Padding with `.` characters does not affect the solution
-    # but avoids special cases for ends of original string
-    if base_level:
-        string = "." + string + nums[-1] * "."
+def _non_dot_runs(string: str) -> list[int]:
+    # runs[i] = length of the run of non-'.' characters starting at i
+    runs = (len(string) + 1) * [0]
+    for i in range(len(string) - 1, -1, -1):
+        runs[i] = runs[i + 1] + 1 if string[i] != "." else 0
+    return runs
 
-    # Loop from nidex 1: skip first character, as there must be
-    # a gap between contiguous blocks. On first iteration,
-    # there is an extra '.' character prepended
-    # Loop until len(string) - nums[0]: block of length nums[0]
-    # must fit into remaining string for a valid solution
-    for i in range(1, len(string) - nums[0]):
-        char = string[i]
 
-        if char in ["#", "?"]:
-            # Conditions to check if block can start here
-            # First condition: all nums[0] next characters are '#' or '?'
-            condition_1 = all([c in ["#", "?"] for c in string[i : i + nums[0]]])
+def count_arrangements(string: str, nums: list[int]) -> int:
+    # Iterative DP over (position, group index), from the last group back
+    # to the first. ways[i] = number of ways to place the remaining groups
+    # in string[i:]. Only the arrays for the current and next group are kept
+    n = len(string)
+    runs = _non_dot_runs(string)
 
-            # Second condition: the character after the next nums[0]
-            # characters cannot be a '#' (must be a gap between blocks)
-            condition_2 = string[i + nums[0]] != "#"
+    # No groups left: valid only if there are no further '#' characters
+    # Extra entry at n + 1, for a block ending exactly at the end of string
+    ways = (n + 2) * [0]
+    ways[n] = ways[n + 1] = 1
+    for i in range(n - 1, -1, -1):
+        ways[i] = ways[i + 1] if string[i] != "#" else 0
 
-            # Third condition: Previous character cannot be a '#'
-            # for a similar reason
-            condition_3 = string[i - 1] != "#"
+    for size in reversed(nums):
+        next_ways = ways
+        ways = (n + 2) * [0]
 
-            if all([condition_1, condition_2, condition_3]):
-                # Convert back to string
-                next_nums = ",".join([str(x) for x in nums[1:]])
+        for i in range(n - 1, -1, -1):
+            # Either leave string[i] as a gap (not possible for a '#')...
+            if string[i] != "#":
+                ways[i] = ways[i + 1]
 
-                # Recurse on remaining string after block, with one fewer
-                # remaining block to consider
-                num += num_possible_arrays(string[i + nums[0] :], next_nums, False)
+            # ...or start a block of length size here: all size characters
+            # must be '#' or '?', and the character after it cannot be '#'
+            end = i + size
+            if runs[i] >= size and (end == n or string[end] != "#"):
+                ways[i] += next_ways[end + 1]
 
-        # Once a '#' character is hit, the next block must start here
-        if char == "#":
-            break
-
-    return num
+    return ways[0]
 
 
 def unfold_input(array: str, nums: str, factor: int = 5) -> tuple[str]:
     arrays = factor * [array]
     nums = factor * [nums]
     return ("?".join(arrays), ",".join(nums))
+
+
+def _step(states: dict[tuple[int], int], char: str, nums: list[int], limit: int):
+    # Advance forward DP states by one character. A state (j, r) means j
+    # groups are complete and r characters of group j have been placed
+    # (r = 0 when not inside a block)
+    new_states = {}
+    for (j, r), ways in states.items():
+        size = nums[j % len(nums)] if j < limit else 0
+
+        if char in ".?":
+            # Gap: allowed if not in a block, or if the block is complete
+            if r == 0:
+                new_states[(j, 0)] = new_states.get((j, 0), 0) + ways
+            elif r == size:
+                new_states[(j + 1, 0)] = new_states.get((j + 1, 0), 0) + ways
+
+        if char in "#?" and j < limit and r < size:
+            # Part of a block: start or continue group j
+            new_states[(j, r + 1)] = new_states.get((j, r + 1), 0) + ways
+
+    return new_states
+
+
+def arrangements_by_factor(string: str, nums: list[int], max_factor: int) -> list[int]:
+    # Number of arrangements of unfold_input(string, nums, factor), for each
+    # factor in 1..max_factor. Rather than rebuilding the unfolded row for each
+    # factor, one forward DP runs across the copies, carrying its states over
+    # each '?' join - the counts for factor c are read off after copy c.
+    #
+    # Each copy (and its join) costs len(string) x (number of live states).
+    # States that have fallen too far behind to finish by max_factor are
+    # dropped, so for tightly constrained rows (like most puzzle rows) only
+    # a few group offsets stay live and the sweep is roughly linear in
+    # max_factor. For rows with a lot of slack (e.g. "?" * 20 with [1, 1])
+    # nearly every group offset stays reachable, and the worst case is
+    # O(max_factor^2 x len(string) x max(nums)) overall
+    limit = max_factor * len(nums)
+    states = {(0, 0): 1}
+    counts = []
+
+    # At most this many groups can be completed while reading one copy
+    # and its join
+    max_per_copy = (len(string) + 1) // (min(nums, default=1) + 1) + 1
+    catch_up = max(max_per_copy - len(nums), 0)
+
+    for copy in range(1, max_factor + 1):
+        if copy > 1:
+            states = _step(states, "?", nums, limit)
+        for char in string:
+            states = _step(states, char, nums, limit)
+
+        # Valid endings: all copy * len(nums) groups complete, possibly
+        # with the final block finishing on the last character
+        n_groups = copy * len(nums)
+        complete = states.get((n_groups, 0), 0)
+        if n_groups > 0:
+            complete += states.get((n_groups - 1, nums[-1]), 0)
+        counts.append(complete)
+
+        # Drop states too far behind to reach n_groups by max_factor
+        lowest = n_groups - (max_factor - copy) * catch_up
+        states = {state: ways for state, ways in states.items() if state[0] >= lowest}
+
+    return counts
@@ -12,41 +12,61 @@ def process_input(input_list: list[str]) -> list[list[str]]:
 
 
 def summarise_notes(grid: list[str], num_differences=0) -> int:
-    # n columns, m rows
-    n = len(grid[0])
-    m = len(grid)
+    return mirror_summaries(grid, num_differences)[num_differences]
 
-    # A neat way to transpose a list of strings!
-    transposed_grid = list(map(lambda x: "".join(x), zip(*grid)))
 
-    # Check each potential row/column mirror position
-    # Exact reflections will have 0 differences
-    potential_horizontal_line = [
-        sum_differences(grid[j::-1], grid[j + 1 :]) for j in range(m - 1)
-    ]
-    potential_vertical_line = [
-        sum_differences(transposed_grid[i::-1], transposed_grid[i + 1 :])
-        for i in range(n - 1)
-    ]
+def encode_grid(grid: list[str]) -> tuple[list[int]]:
+    # Encode each row and each column once as an integer bitmask,
+    # with a set bit for every '#'
+    rows = [0] * len(grid)
+    cols = [0] * len(grid[0])
+    for i, row in enumerate(grid):
+        for j, char in enumerate(row):
+            if char == "#":
+                rows[i] |= 1 << j
+                cols[j] |= 1 << i
+    return rows, cols
+
+
+def _line_differences(lines: list[int], max_differences: int) -> list[int]:
+    # Number of differing cells for a mirror after each line, found by XOR
+    # and popcount of each mirrored pair. Counting stops once it passes
+    # max_differences, as those lines can never be used
+    differences = []
+    for j in range(len(lines) - 1):
+        total = 0
+        for k in range(min(j + 1, len(lines) - j - 1)):
+            total += (lines[j - k] ^ lines[j + 1 + k]).bit_count()
+            if total > max_differences:
+                break
+        differences.append(total)
+    return differences
+
+
+def mirror_summaries(grid: list[str], max_differences: int = 1) -> list[int]:
+    # Summaries for mirror lines with exactly 0, 1, ..., max_differences
+    # differences (e.g. exact and one-smudge lines), from a single pass
+    rows, cols = encode_grid(grid)
+    summaries = (max_differences + 1) * [0]
+
+    for j, val in enumerate(_line_differences(rows, max_differences)):
+        if val <= max_differences:
+            summaries[val] += 100 * (j + 1)
+    for i, val in enumerate(_line_differences(cols, max_differences)):
+        if val <= max_differences:
+            summaries[val] += i + 1
+
+    return summaries
+
 
-    # Compute the summaries by finding entries with 0 differences
-    horizontal_summary = sum(
-        [
-            100 * (j + 1)
-            for j, val in enumerate(potential_horizontal_line)
-            if val == num_differences
-        ]
-    )
-    vertical_summary = sum(
-        [
-            i + 1
-            for i, val in enumerate(potential_vertical_line)
-            if val == num_differences
-        ]
-    )
-
-    # Puzzle leaves open possibility of multiple mirror lines
-    return horizontal_summary + vertical_summary
+def summarise_all(grids: list[list[str]], max_differences: int = 1) -> list[int]:
+    # Batch version of mirror_summaries, summed over every grid
+    # from process_input
+    totals = (max_differences + 1) * [0]
+    for grid in grids:
+        for d, summary in enumerate(mirror_summaries(grid, max_differences)):
+            totals[d] += summary
+    return totals
 
 
 def sum_differences(half_1: list[str], half_2: list[str]) -> int:
@@ -1,4 +1,9 @@
+import copy
 import math
+import hashlib
+from array import array
+from dataclasses import dataclass
+import numpy as np
 
 
 def roll_east(grid: list[str]) -> list[str]:
@@ -63,39 +68,153 @@ def spin_cycle(grid: list[str]) -> list[str]:
 
 
 def spin_cycle_n_times(input_grid: list[str], N: int) -> list[str]:
-    # Initialise to keep track of found grids
-    grid = input_grid
-    found_grids = {"".join(grid): 0}
-
-    # Loop up to N (max possible value needed)
+    # Spin history keyed by grid fingerprints, with packed grids for O(1)
+    # lookup of the grid after any number of spin cycles
+    history = spin_cycle_history(input_grid, N, loads_only=False)
+    if history.c:
+        print(f"n = {history.n}, c = {history.c}")
+    return history.grid_at(N)
+
+
+class Platform:
+    def __init__(self, grid: list[str]):
+        # Round rocks are kept as a flat boolean array, tilted in place
+        # Cube rocks never move, so the segments between them are fixed
+        self.n_rows = len(grid)
+        self.n_cols = len(grid[0])
+
+        chars = np.array([list(row) for row in grid])
+        self.is_cube = (chars == "#").ravel()
+        self.rocks = (chars == "O").ravel()
+
+        # Precompute the segments for each tilt direction
+        self.segments = {
+            direction: self._compute_segments(direction) for direction in "nesw"
+        }
+
+    def _compute_segments(self, direction: str) -> tuple[np.ndarray]:
+        # Arrange the flat cell indices into lines, so that rocks roll towards
+        # the start of each line when tilted in this direction
+        idx = np.arange(self.n_rows * self.n_cols).reshape(self.n_rows, self.n_cols)
+        match direction:
+            case "n":
+                lines = idx.T
+            case "e":
+                lines = idx[:, ::-1]
+            case "s":
+                lines = idx[::-1].T
+            case "w":
+                lines = idx
+            case _:
+                raise ValueError("Direction not recognised!")
+
+        # A segment starts at the start of each line, and after each cube rock
+        cells = lines.ravel()
+        cube = self.is_cube[lines]
+        starts = np.zeros(lines.shape, dtype=bool)
+        starts[:, 0] = True
+        starts[:, 1:] = cube[:, :-1]
+        starts = starts.ravel()
+
+        segment_ids = np.cumsum(starts) - 1
+        positions = np.arange(len(cells))
+        position_in_segment = positions - positions[starts][segment_ids]
+
+        # Cube rocks are not part of any segment
+        keep = ~cube.ravel()
+        return (
+            cells[keep],
+            segment_ids[keep],
+            position_in_segment[keep],
+            int(starts.sum()),
+        )
+
+    def tilt(self, direction: str):
+        # Count the round rocks in each segment, then pack them
+        # against the start of the segment
+        cells, segment_ids, position_in_segment, n_segments = self.segments[
+            direction.lower()
+        ]
+        counts = np.bincount(
+            segment_ids, weights=self.rocks[cells], minlength=n_segments
+        )
+        self.rocks[cells] = position_in_segment < counts[segment_ids]
+
+    def spin_cycle(self):
+        for direction in "nwse":
+            self.tilt(direction)
+
+    def compute_load(self) -> int:
+        # Rocks in row i contribute n_rows - i each
+        rows = np.nonzero(self.rocks)[0] // self.n_cols
+        return int((self.n_rows - rows).sum())
+
+    def to_grid(self) -> list[str]:
+        chars = np.where(self.is_cube, "#", np.where(self.rocks, "O", "."))
+        return ["".join(row) for row in chars.reshape(self.n_rows, self.n_cols)]
+
+
+def grid_fingerprint(rocks: np.ndarray) -> bytes:
+    # Fixed-size (16 byte) fingerprint of the round rock positions
+    return hashlib.blake2b(np.packbits(rocks).tobytes(), digest_size=16).digest()
+
+
+@dataclass
+class SpinHistory:
+    n: int  # spin cycles before the cycle starts
+    c: int  # cycle length (0 if no cycle was found)
+    loads: array  # loads[i] = load after i spin cycles
+    states: list[np.ndarray] = None  # packed rock positions, if stored
+    platform: Platform = None
+
+    def _step(self, N: int) -> int:
+        # Equivalent step within the recorded history. Without a cycle, only
+        # the steps actually spun are known
+        if self.c == 0 or N < self.n:
+            if N >= len(self.loads):
+                recorded = len(self.loads) - 1
+                raise ValueError(f"No cycle in the first {recorded} spin cycles!")
+            return N
+        return self.n + (N - self.n) % self.c
+
+    def load_at(self, N: int) -> int:
+        return self.loads[self._step(N)]
+
+    def grid_at(self, N: int) -> list[str]:
+        if self.states is None:
+            raise ValueError("Grids were not stored - use loads_only=False!")
+        # Unpack into a copy, leaving the stored platform untouched
+        platform = copy.copy(self.platform)
+        platform.rocks = np.unpackbits(
+            self.states[self._step(N)], count=len(platform.rocks)
+        ).astype(bool)
+        return platform.to_grid()
+
+
+def spin_cycle_history(
+    input_grid: list[str], N: int, loads_only: bool = True
+) -> SpinHistory:
+    # Spin until a repeated state (or N cycles), keeping fingerprints for
+    # cycle detection and a step-indexed history of loads - and, optionally,
+    # of packed grids. The state after any number of cycles is then O(1)
+    platform = Platform(input_grid)
+    found = {grid_fingerprint(platform.rocks): 0}
+    loads = array("q", [platform.compute_load()])
+    states = None if loads_only else [np.packbits(platform.rocks)]
+
+    n, c = 0, 0
     for i in range(N):
-        grid = spin_cycle(grid)
-        grid_str = "".join(grid)  # hashable
-
-        if grid_str in found_grids:
-            # Already found grid - compute n and c
-            # and stop iterating
-            n_plus_c = i + 1
-            n = found_grids[grid_str]
-            c = n_plus_c - n
+        platform.spin_cycle()
+        fingerprint = grid_fingerprint(platform.rocks)
+
+        if fingerprint in found:
+            n = found[fingerprint]
+            c = i + 1 - n
             break
 
-        else:
-            # Add new grid to dictionary
-            found_grids[grid_str] = i + 1
-    else:
-        # return final grid, if no previously
-        # found grid observed
-        return grid
-
-    # remainder and new N
-    print(f"n = {n}, c = {c}")
-    r = (N - n) % c
-    N_hat = n + r
-
-    # Invert grid
-    final_grid = [k for k, v in found_grids.items() if v == N_hat][0]
-
-    # Convert grid_str back into grid
-    m, n = len(input_grid), len(input_grid[0])
-    return [final_grid[n * i : n * (i + 1)] for i in range(m)]
+        found[fingerprint] = i + 1
+        loads.append(platform.compute_load())
+        if states is not None:
+            states.append(np.packbits(platform.rocks))
+
+    return SpinHistory(n=n, c=c, loads=loads, states=states, platform=platform)
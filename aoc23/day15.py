@@ -1,4 +1,5 @@
 import math
+import numpy as np
 
 
 def hash_algorithm(string: str) -> int:
@@ -10,6 +11,88 @@ def hash_algorithm(string: str) -> int:
     return current_value
 
 
+COMMA = ord(",")
+NEWLINE = ord("\n")
+
+
+# Positions mod 256, tiled out to the length of each chunk
+POSITIONS = np.arange(256, dtype=np.uint8)
+
+
+def _hash_chunk(chunk: np.ndarray, commas: np.ndarray = None) -> np.ndarray:
+    # HASH of every step in a chunk of complete, comma-separated steps.
+    # Unrolling the loop, a step c_1...c_k hashes to
+    # sum(c_i * 17^(k - i + 1)) mod 256, and 17^d = 1 + 16d (mod 256).
+    # With d = end - position, a step ending at (exclusive) end hashes to
+    # sum(c) + 16 * (end * sum(c) - sum(c * position)), so two segment sums
+    # give every step. Only values mod 256 matter, so everything stays in
+    # (wrapping) uint8 arithmetic
+    newlines = chunk == NEWLINE
+    if newlines.any():
+        chunk = chunk[~newlines]
+        commas = None
+    if commas is None:
+        commas = np.flatnonzero(chunk == COMMA)
+
+    # reduceat needs every step to start inside the chunk, so an empty
+    # final step (which hashes to 0) is added back afterwards
+    if len(chunk) == 0:
+        return np.zeros(1, dtype=np.uint8)
+    if chunk[-1] == COMMA:
+        return np.append(_hash_chunk(chunk[:-1], commas[:-1]), np.uint8(0))
+
+    # Sums from each step start up to the next one - each step but the
+    # last also takes in the comma after it, which is then taken back out
+    starts = np.concatenate([[0], commas + 1])
+    ends = np.concatenate([commas, [len(chunk)]])
+    positions = np.tile(POSITIONS, len(chunk) // 256 + 1)[: len(chunk)]
+
+    sums = np.add.reduceat(chunk, starts, dtype=np.uint8)
+    moments = np.add.reduceat(chunk * positions, starts, dtype=np.uint8)
+    sums[:-1] -= COMMA
+    moments[:-1] -= (COMMA * commas).astype(np.uint8)
+
+    return sums + 16 * (ends.astype(np.uint8) * sums - moments)
+
+
+def hash_steps(data: bytes | np.ndarray, chunk_size: int = 1 << 22) -> np.ndarray:
+    # HASH of every step of a whole comma-separated init sequence, given as
+    # a uint8 array (e.g. a np.memmap) or any bytes-like buffer (bytes,
+    # bytearray, memoryview, mmap). The buffer is processed in chunks that
+    # end on a comma, so memory use is bounded by chunk_size
+    if isinstance(data, np.ndarray):
+        buffer = data
+    else:
+        buffer = np.frombuffer(data, dtype=np.uint8)
+    hashes = []
+
+    start = 0
+    while True:
+        stop = start + chunk_size
+        if stop >= len(buffer):
+            hashes.append(_hash_chunk(buffer[start:]))
+            break
+
+        # Move the end of the chunk back to the last comma in it
+        # (or on to the next one, for a step longer than chunk_size).
+        # The commas before it are the step boundaries within the chunk
+        commas = np.flatnonzero(buffer[start:stop] == COMMA)
+        if len(commas) == 0:
+            chunk_size *= 2
+            continue
+
+        stop = start + commas[-1]
+        hashes.append(_hash_chunk(buffer[start:stop], commas[:-1]))
+        start = stop + 1
+
+    return np.concatenate(hashes)
+
+
+def hash_file(filename: str, chunk_size: int = 1 << 22) -> np.ndarray:
+    # HASH every step of a file, memory-mapped rather than read into memory
+    return hash_steps(np.memmap(filename, dtype=np.uint8, mode="r"), chunk_size)
+
+
 def place_lenses(steps: list[str]) -> list[dict[str, int]]:
     # Each box: {label: focal}
     boxes = [{} for _ in range(256)]
@@ -43,3 +126,123 @@ def compute_focusing_power(boxes):
         for slot, (label, focal) in enumerate(box.items()):
             power += (box_num + 1) * (slot + 1) * focal
     return power
+
+
+class FenwickTree:
+    def __init__(self, size: int):
+        # Binary indexed tree over positions 0..size-1
+        self.tree = (size + 1) * [0]
+
+    def add(self, i: int, value: int):
+        i += 1
+        while i < len(self.tree):
+            self.tree[i] += value
+            i += i & -i
+
+    def prefix_sum(self, i: int) -> int:
+        # Sum over positions 0..i (inclusive)
+        total = 0
+        i += 1
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class LensBox:
+    def __init__(self, capacity: int = 8):
+        # Each lens gets an increasing insertion number. Its slot is the
+        # number of lenses still in the box inserted no later than it, which
+        # the count tree gives in O(log k) - so removals never shift a list
+        self.lenses = {}  # label: (insertion number, focal)
+        self._rebuild(capacity)
+
+    def _rebuild(self, capacity: int):
+        # Renumber the remaining lenses 0..k-1, in order, in fresh trees
+        ordered = sorted(self.lenses.items(), key=lambda item: item[1][0])
+        self.counts = FenwickTree(capacity)
+        self.focals = FenwickTree(capacity)
+        self.lenses = {}
+        self.next_number = 0
+        for label, (_, focal) in ordered:
+            self._insert(label, focal)
+
+    def _insert(self, label: str, focal: int):
+        number = self.next_number
+        self.next_number += 1
+        self.lenses[label] = (number, focal)
+        self.counts.add(number, 1)
+        self.focals.add(number, focal)
+
+    def slot(self, label: str) -> int:
+        return self.counts.prefix_sum(self.lenses[label][0])
+
+    def place(self, label: str, focal: int) -> int:
+        # Replace or add lens, returning the change in sum(slot * focal)
+        if label in self.lenses:
+            number, old_focal = self.lenses[label]
+            self.lenses[label] = (number, focal)
+            self.focals.add(number, focal - old_focal)
+            return self.slot(label) * (focal - old_focal)
+
+        if self.next_number == len(self.counts.tree) - 1:
+            self._rebuild(max(8, 2 * (len(self.lenses) + 1)))
+        self._insert(label, focal)
+        return len(self.lenses) * focal
+
+    def remove(self, label: str) -> int:
+        # Remove lens (if it exists), returning the change in sum(slot * focal)
+        # Every later lens moves forward one slot, losing its focal once
+        if label not in self.lenses:
+            return 0
+
+        number, focal = self.lenses.pop(label)
+        slot = self.counts.prefix_sum(number)
+        later_focals = self.focals.prefix_sum(len(self.counts.tree) - 2)
+        later_focals -= self.focals.prefix_sum(number)
+        self.counts.add(number, -1)
+        self.focals.add(number, -focal)
+
+        return -(slot * focal + later_focals)
+
+
+class HashMap:
+    def __init__(self):
+        self.boxes = [LensBox() for _ in range(256)]
+        self.focusing_power = 0
+
+    def apply(self, step: str) -> int:
+        # Apply one step, keeping the total focusing power up to date
+        if step[-1] == "-":
+            label = step[:-1]
+            box_idx = hash_algorithm(label)
+            change = self.boxes[box_idx].remove(label)
+
+        elif "=" in step:
+            label, focal = step.split("=")
+            box_idx = hash_algorithm(label)
+            change = self.boxes[box_idx].place(label, int(focal))
+
+        else:
+            raise ValueError("invalid step!")
+
+        self.focusing_power += (box_idx + 1) * change
+        return self.focusing_power
+
+    def to_boxes(self) -> list[dict[str, int]]:
+        # Same layout as place_lenses
+        return [
+            {
+                label: focal
+                for label, (_, focal) in sorted(
+                    box.lenses.items(), key=lambda item: item[1][0]
+                )
+            }
+            for box in self.boxes
+        ]
+
+
+def running_focusing_power(steps: list[str]) -> list[int]:
+    # Total focusing power after each step
+    hashmap = HashMap()
+    return [hashmap.apply(step) for step in steps]
@@ -1,3 +1,7 @@
+import math
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable
 import matplotlib.pyplot as plt
 
 LIGHT_DIRECTION = {}
@@ -130,49 +134,294 @@ def visualise_charged_tiles(
             )
 
 
-def maximise_charged_tiles(grid: list[str]) -> tuple[tuple[int], str, int]:
+def edge_starts(n_rows: int, n_cols: int) -> list[tuple[tuple[int], str]]:
+    # Every (start_tile, start_direction) along the edges of the grid,
+    # in the order top, left, bottom, right
+    return [
+        *[((0, j), "s") for j in range(n_cols)],
+        *[((i, 0), "e") for i in range(n_rows)],
+        *[((n_rows - 1, j), "n") for j in range(n_cols)],
+        *[((i, n_cols - 1), "w") for i in range(n_rows)],
+    ]
+
+
+def maximise_charged_tiles(
+    grid: list[str], processes: int = 1
+) -> tuple[tuple[int], str, int]:
     n_rows = len(grid)
     n_cols = len(grid[0])
+    starts = edge_starts(n_rows, n_cols)
+
+    # Charge from each start, in edge order - optionally spread across
+    # a process pool. Each start is one trace plus a union over reachable
+    # components of a BeamGraph
+    if processes > 1:
+        charges = _parallel_charges(grid, starts, processes)
+    else:
+        graph = BeamGraph(grid)
+        charges = (graph.count_charged_tiles(tile, d) for tile, d in starts)
+
+    return _best_start(starts, charges)
 
-    # Keep track of maximums
+
+def _best_start(
+    starts: list[tuple[tuple[int], str]], charges: Iterable[int]
+) -> tuple[tuple[int], str, int]:
+    # Start with the most charged tiles, given the charges for each start
+    # Strict comparison, so ties go to the earliest start
     max_charge = 0
     max_start_tile = None
     max_direction = None
 
-    # Top edge
-    for j in range(n_cols):
-        n = len(find_charged_tiles(grid, start_tile=(0, j), start_direction="s"))
+    for (start_tile, direction), n in zip(starts, charges):
         if n > max_charge:
             max_charge = n
-            max_start_tile = (0, j)
-            max_direction = "s"
+            max_start_tile = start_tile
+            max_direction = direction
 
-    # Left edge
-    for i in range(n_rows):
-        n = len(find_charged_tiles(grid, start_tile=(i, 0), start_direction="e"))
-        if n > max_charge:
-            max_charge = n
-            max_start_tile = (i, 0)
-            max_direction = "e"
-
-    # Bottom edge
-    for j in range(n_cols):
-        n = len(
-            find_charged_tiles(grid, start_tile=(n_rows - 1, j), start_direction="n")
-        )
-        if n > max_charge:
-            max_charge = n
-            max_start_tile = (n_rows - 1, j)
-            max_direction = "n"
+    return max_start_tile, max_direction, max_charge
 
-    # Right edge
-    for i in range(n_rows):
-        n = len(
-            find_charged_tiles(grid, start_tile=(i, n_cols - 1), start_direction="w")
-        )
-        if n > max_charge:
-            max_charge = n
-            max_start_tile = (i, n_cols - 1)
-            max_direction = "w"
 
-    return max_start_tile, max_direction, max_charge
+# Each worker process builds the BeamGraph once, in its initializer, rather
+# than having it pickled with every task
+_worker_graph = None
+
+
+def _init_worker(grid: list[str]):
+    global _worker_graph
+    _worker_graph = BeamGraph(grid)
+
+
+def _count_starts(starts: list[tuple[tuple[int], str]]) -> list[int]:
+    return [_worker_graph.count_charged_tiles(tile, d) for tile, d in starts]
+
+
+def _parallel_charges(
+    grid: list[str], starts: list[tuple[tuple[int], str]], processes: int
+) -> list[int]:
+    # Split the starts into contiguous chunks - map returns results in
+    # order, so the sweep is deterministic
+    chunk_size = math.ceil(len(starts) / (4 * processes))
+    chunks = [starts[i : i + chunk_size] for i in range(0, len(starts), chunk_size)]
+
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=(grid,)
+    ) as executor:
+        return [n for counts in executor.map(_count_starts, chunks) for n in counts]
+
+
+class BeamGraph:
+    def __init__(self, grid: list[str]):
+        # Beam paths only branch at splitters, so trace the path segments
+        # leaving each splitter once. Each splitter becomes a node, with the
+        # tiles its two segments charge (as a bitset), and edges to the
+        # splitters those segments run into
+        self.grid = grid
+        self.n_rows = len(grid)
+        self.n_cols = len(grid[0])
+
+        self.splitters = [
+            (row, col)
+            for row in range(self.n_rows)
+            for col in range(self.n_cols)
+            if grid[row][col] in "|-"
+        ]
+        self.node_index = {tile: i for i, tile in enumerate(self.splitters)}
+
+        self.node_tiles = []
+        self.edges = []
+        for row, col in self.splitters:
+            tiles = self._bit(row, col)
+            targets = []
+            # A splitter hit side-on sends beams out both ways
+            side_on = "e" if grid[row][col] == "|" else "n"
+            for direction in LIGHT_DIRECTION[(grid[row][col], side_on)]:
+                segment_tiles, target = self._trace(
+                    *new_index(row, col, direction), direction
+                )
+                tiles |= segment_tiles
+                if target is not None:
+                    targets.append(target)
+            self.node_tiles.append(tiles)
+            self.edges.append(targets)
+
+        self._condense()
+
+    def _bit(self, row: int, col: int) -> int:
+        return 1 << (row * self.n_cols + col)
+
+    def _trace(self, row: int, col: int, direction: str) -> tuple[int, int]:
+        # Follow a beam until it leaves the grid, or hits a splitter that
+        # splits it. Returns the bitset of charged tiles, and the index of
+        # that splitter (or None)
+        tiles = 0
+        seen = set()
+        while (0 <= row < self.n_rows) and (0 <= col < self.n_cols):
+            # A beam can loop back through a splitter edge-on, forever
+            if (row, col, direction) in seen:
+                break
+            seen.add((row, col, direction))
+
+            tiles |= self._bit(row, col)
+            new_direction = LIGHT_DIRECTION[(self.grid[row][col], direction)]
+            if len(new_direction) == 2:
+                return tiles, self.node_index[(row, col)]
+
+            direction = new_direction
+            row, col = new_index(row, col, direction)
+
+        return tiles, None
+
+    def _condense(self):
+        # Tarjan's algorithm (iterative) for the strongly connected
+        # components. Components are completed sinks first, so the tiles
+        # reachable from each one can be built from those already done
+        n_nodes = len(self.splitters)
+        index = n_nodes * [None]
+        lowlink = n_nodes * [0]
+        on_stack = n_nodes * [False]
+        stack = []
+        counter = 0
+
+        self.component = n_nodes * [None]
+        self.reachable_tiles = []
+
+        for root in range(n_nodes):
+            if index[root] is not None:
+                continue
+
+            work = [(root, 0)]
+            while work:
+                node, edge_idx = work.pop()
+                if edge_idx == 0:
+                    index[node] = lowlink[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack[node] = True
+
+                # Visit the next unvisited neighbour, resuming afterwards
+                for i in range(edge_idx, len(self.edges[node])):
+                    neighbour = self.edges[node][i]
+                    if index[neighbour] is None:
+                        work.append((node, i + 1))
+                        work.append((neighbour, 0))
+                        break
+                    elif on_stack[neighbour]:
+                        lowlink[node] = min(lowlink[node], index[neighbour])
+                else:
+                    if lowlink[node] == index[node]:
+                        self._add_component(node, stack, on_stack)
+                    if work:
+                        parent = work[-1][0]
+                        lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+    def _add_component(self, root: int, stack: list[int], on_stack: list[bool]):
+        # Pop the component rooted at root, and union its own tiles with
+        # the reachable tiles of every component it leads to
+        component_idx = len(self.reachable_tiles)
+        members = []
+        while True:
+            node = stack.pop()
+            on_stack[node] = False
+            self.component[node] = component_idx
+            members.append(node)
+            if node == root:
+                break
+
+        tiles = 0
+        for node in members:
+            tiles |= self.node_tiles[node]
+            for neighbour in self.edges[node]:
+                if self.component[neighbour] != component_idx:
+                    tiles |= self.reachable_tiles[self.component[neighbour]]
+        self.reachable_tiles.append(tiles)
+
+    def charged_tiles_bitset(
+        self, start_tile: tuple[int] = None, start_direction: str = "e"
+    ) -> int:
+        start_tile = start_tile or (0, 0)
+        tiles, target = self._trace(*start_tile, start_direction)
+        if target is not None:
+            tiles |= self.reachable_tiles[self.component[target]]
+        return tiles
+
+    def count_charged_tiles(
+        self, start_tile: tuple[int] = None, start_direction: str = "e"
+    ) -> int:
+        return self.charged_tiles_bitset(start_tile, start_direction).bit_count()
+
+    def maximise_charged_tiles(self) -> tuple[tuple[int], str, int]:
+        # Same result as maximise_charged_tiles, with each start costing
+        # one trace and one union
+        starts = edge_starts(self.n_rows, self.n_cols)
+        charges = (self.count_charged_tiles(tile, d) for tile, d in starts)
+        return _best_start(starts, charges)
+
+
+# Integer encodings for directions and tile types
+DIRECTIONS = "nesw"
+TILES = ".\\/|-"
+
+# TRANSITIONS[tile * 4 + direction] = outgoing directions
+TRANSITIONS = [
+    tuple(DIRECTIONS.index(d) for d in LIGHT_DIRECTION[(tile, direction)])
+    for tile in TILES
+    for direction in DIRECTIONS
+]
+
+
+class CompiledGrid:
+    def __init__(self, grid: list[str]):
+        # Tiles are stored as integer codes in a flat bytes object, and
+        # neighbours[cell * 4 + direction] gives the next cell (or -1 if the
+        # beam leaves the grid). Beam states are then plain integers
+        # (row * n_cols + col) * 4 + direction
+        self.n_rows = len(grid)
+        self.n_cols = len(grid[0])
+        self.tiles = bytes(TILES.index(c) for row in grid for c in row)
+
+        self.neighbours = array("i", 4 * self.n_rows * self.n_cols * [-1])
+        for row in range(self.n_rows):
+            for col in range(self.n_cols):
+                cell = row * self.n_cols + col
+                for direction, char in enumerate(DIRECTIONS):
+                    new_row, new_col = new_index(row, col, char)
+                    if (0 <= new_row < self.n_rows) and (0 <= new_col < self.n_cols):
+                        self.neighbours[4 * cell + direction] = (
+                            new_row * self.n_cols + new_col
+                        )
+
+    def charged_tiles(
+        self, start_tile: tuple[int] = None, start_direction: str = "e"
+    ) -> bytearray:
+        # Flat bytearray with a 1 for every charged tile
+        start_tile = start_tile or (0, 0)
+        start = (start_tile[0] * self.n_cols + start_tile[1]) * 4
+        start += DIRECTIONS.index(start_direction)
+
+        tiles = self.tiles
+        neighbours = self.neighbours
+        seen = bytearray(4 * len(tiles))
+        charged = bytearray(len(tiles))
+
+        seen[start] = 1
+        stack = [start]
+        while stack:
+            state = stack.pop()
+            cell = state >> 2
+            charged[cell] = 1
+
+            for direction in TRANSITIONS[tiles[cell] * 4 + (state & 3)]:
+                new_cell = neighbours[4 * cell + direction]
+                if new_cell >= 0:
+                    new_state = 4 * new_cell + direction
+                    if not seen[new_state]:
+                        seen[new_state] = 1
+                        stack.append(new_state)
+
+        return charged
+
+    def count_charged_tiles(
+        self, start_tile: tuple[int] = None, start_direction: str = "e"
+    ) -> int:
+        return self.charged_tiles(start_tile, start_direction).count(1)
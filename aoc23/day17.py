@@ -1,10 +1,20 @@
-import math
-from itertools import product
-from heapq import heapify, heappop, heappush
 import matplotlib.pyplot as plt
 import numpy as np
 
 
+def cost_prefix_sums(grid: list[str]) -> tuple[np.ndarray]:
+    # Flat cost array, with flat prefix sums down each column and along each row
+    costs = np.array([[int(c) for c in row] for row in grid], dtype=np.int64)
+    n_rows, n_cols = costs.shape
+
+    col_prefix = np.zeros((n_rows + 1, n_cols), dtype=np.int64)
+    col_prefix[1:] = np.cumsum(costs, axis=0)
+    row_prefix = np.zeros((n_rows, n_cols + 1), dtype=np.int64)
+    row_prefix[:, 1:] = np.cumsum(costs, axis=1)
+
+    return costs.ravel(), col_prefix.ravel(), row_prefix.ravel()
+
+
 class PathFinder:
     def __init__(self, grid: list[str], min_step: int = 1, max_step: int = 3):
         self.grid = grid
@@ -14,97 +24,120 @@ class PathFinder:
         self.n_rows = len(grid)
         self.n_cols = len(grid[0])
 
-        # Initialise f-scores and g-scores to infinity
-        # Also initialise for the starting node
-        self.g_score = {
-            (row, col, parity): math.inf
-            for row, col, parity in product(
-                range(self.n_rows), range(self.n_cols), [0, 1]
-            )
-        }
-        self.g_score[(0, 0, 0)] = 0
-        self.g_score[(0, 0, 1)] = 0
-
-        self.f_score = {
-            (row, col, parity): math.inf
-            for row, col, parity in product(
-                range(self.n_rows), range(self.n_cols), [0, 1]
-            )
-        }
-        self.f_score[(0, 0, 0)] = self.n_rows + self.n_cols - 2
-        self.f_score[(0, 0, 1)] = self.n_rows + self.n_cols - 2
+        # Prefix sums of the costs down each column and along each row,
+        # so that the cost of any straight segment is O(1)
+        # col_prefix[r * n_cols + c] = sum of costs above row r in column c
+        # row_prefix[r * (n_cols + 1) + c] = sum of costs left of col c in row r
+        _, self.col_prefix, self.row_prefix = cost_prefix_sums(grid)
 
-        # Create node heap
-        self.nodes = []
-        heapify(self.nodes)
+        # States (row, col, parity) are flattened to (row * n_cols + col) * 2
+        # + parity. Parity 0 = next move is along a column, 1 = along a row
+        # g-scores start at "infinity" (larger than any path cost)
+        n_states = 2 * self.n_rows * self.n_cols
+        self.infinity = 9 * n_states + 1
+        self.g_score = np.full(n_states, self.infinity, dtype=np.int64)
+        self.came_from = np.full(n_states, -1, dtype=np.int64)
 
         # Help to track the optimal paths
-        self.came_from = {}
         self.optimal_came_from = {}
         self.optimal_path_found = False
 
+    def state_index(self, row: int, col: int, parity: int) -> int:
+        return (row * self.n_cols + col) * 2 + parity
+
     def compute_path(self):
-        # Add the start node to the heap
-        # One for each possible starting parity
-        # Store as (f(n), n), so that natural ordering is
-        # used by heap to order by f-score
-        heappush(self.nodes, (self.f_score[(0, 0, 0)], (0, 0, 0)))
-        heappush(self.nodes, (self.f_score[(0, 0, 1)], (0, 0, 1)))
-
-        while len(self.nodes) > 0:
-            # Pop the node with the best fscore
-            _, (row, col, parity) = heappop(self.nodes)
-
-            if row == self.n_rows - 1 and col == self.n_cols - 1:
-                # Reached final node - terminate
-                self.optimal_path_found = True
-                return None
-
-            # Defines the range of steps the crucible can take (see part 2)
-            step_range = [
-                *range(-self.max_step, -self.min_step + 1),
-                *range(self.min_step, self.max_step + 1),
-            ]
-
-            for i in step_range:
-                # Check if this is a valid neighbouring node
-                if parity % 2 == 0:
-                    if not 0 <= row + i < self.n_rows:
-                        continue
-                    if i < 0:
-                        d = sum([int(self.grid[row + k][col]) for k in range(i, 0)])
-                    else:
-                        d = sum([int(self.grid[row + k][col]) for k in range(1, i + 1)])
-
-                    neighbour = (row + i, col, (parity + 1) % 2)
-                else:
-                    if not 0 <= col + i < self.n_cols:
-                        continue
-                    if i < 0:
-                        d = sum([int(self.grid[row][col + k]) for k in range(i, 0)])
+        # A* with a Dial-style bucket queue: every f-score of a pushed state
+        # is within max_bucket of the current one (steps cost 1-9 per tile,
+        # and the Manhattan heuristic drops by at most 1 per tile), so a
+        # circular array of buckets replaces the heap. States are pushed again
+        # when improved, and stale entries are skipped when popped
+        n_rows, n_cols = self.n_rows, self.n_cols
+        target_row, target_col = n_rows - 1, n_cols - 1
+        n_buckets = 10 * self.max_step + 1
+
+        # Plain lists are much faster than NumPy arrays to index one at a time
+        g_score = self.g_score.tolist()
+        came_from = self.came_from.tolist()
+        col_prefix = self.col_prefix.tolist()
+        row_prefix = self.row_prefix.tolist()
+
+        # Defines the range of steps the crucible can take (see part 2)
+        step_range = [
+            *range(-self.max_step, -self.min_step + 1),
+            *range(self.min_step, self.max_step + 1),
+        ]
+
+        # Add the start node, one for each possible starting parity
+        f_start = target_row + target_col
+        buckets = [[] for _ in range(n_buckets)]
+        for parity in [0, 1]:
+            g_score[parity] = 0
+            buckets[f_start % n_buckets].append(parity)
+        n_queued = 2
+
+        f = f_start
+        while n_queued > 0:
+            bucket = buckets[f % n_buckets]
+            while bucket:
+                state = bucket.pop()
+                n_queued -= 1
+
+                cell, parity = state >> 1, state & 1
+                row, col = divmod(cell, n_cols)
+                g = g_score[state]
+
+                # Lazy deletion - skip entries whose f-score has since improved
+                if g + (target_row - row) + (target_col - col) != f:
+                    continue
+
+                if row == target_row and col == target_col:
+                    # Reached final node - terminate
+                    self.g_score[:] = g_score
+                    self.came_from[:] = came_from
+                    self.optimal_path_found = True
+                    return None
+
+                for i in step_range:
+                    # Check if this is a valid neighbouring node, and find
+                    # the cost of the tiles entered along the way
+                    if parity == 0:
+                        new_row, new_col = row + i, col
+                        if not 0 <= new_row < n_rows:
+                            continue
+                        if i < 0:
+                            d = col_prefix[cell] - col_prefix[cell + i * n_cols]
+                        else:
+                            d = (
+                                col_prefix[cell + (i + 1) * n_cols]
+                                - col_prefix[cell + n_cols]
+                            )
                     else:
-                        d = sum([int(self.grid[row][col + k]) for k in range(1, i + 1)])
-
-                    neighbour = (row, col + i, (parity + 1) % 2)
-
-                # Compute tentative g-score, and compare to current g-score
-                tent_gscore = self.g_score[(row, col, parity)] + d
-                if tent_gscore < self.g_score[neighbour]:
-                    # Update came_from, g_score and f_score using heuristic h
-                    self.came_from[neighbour] = (row, col)
-                    self.g_score[neighbour] = tent_gscore
-                    self.f_score[neighbour] = (
-                        tent_gscore
-                        + (self.n_rows - 1)
-                        - neighbour[0]
-                        + (self.n_cols - 1)
-                        - neighbour[1]
-                    )
-                    # Push new node to heap
-                    if neighbour not in self.nodes:
-                        heappush(self.nodes, (self.f_score[neighbour], neighbour))
-
-        # If heap is emptied before reaching final node, there is no valid path
+                        new_row, new_col = row, col + i
+                        if not 0 <= new_col < n_cols:
+                            continue
+                        k = row * (n_cols + 1) + col
+                        if i < 0:
+                            d = row_prefix[k] - row_prefix[k + i]
+                        else:
+                            d = row_prefix[k + i + 1] - row_prefix[k + 1]
+
+                    # Compare tentative g-score to current g-score
+                    neighbour = (new_row * n_cols + new_col) * 2 + 1 - parity
+                    tent_gscore = g + d
+                    if tent_gscore < g_score[neighbour]:
+                        g_score[neighbour] = tent_gscore
+                        came_from[neighbour] = state
+                        f_neighbour = (
+                            tent_gscore
+                            + (target_row - new_row)
+                            + (target_col - new_col)
+                        )
+                        buckets[f_neighbour % n_buckets].append(neighbour)
+                        n_queued += 1
+
+            f += 1
+
+        # If queue is emptied before reaching final node, there is no valid path
         raise ValueError("A* algorithm failed!")
 
     def find_best(self):
@@ -112,26 +145,22 @@ class PathFinder:
 
         # There are 2 ways to reach the final tile (with each of the possible parities)
         # Find the one with the minimal g-score
-        final_tiles = [
-            self.g_score[(self.n_rows - 1, self.n_cols - 1, 0)],
-            self.g_score[(self.n_rows - 1, self.n_cols - 1, 1)],
+        final_states = [
+            self.state_index(self.n_rows - 1, self.n_cols - 1, 0),
+            self.state_index(self.n_rows - 1, self.n_cols - 1, 1),
         ]
+        final_tiles = [int(self.g_score[state]) for state in final_states]
         print(f"Best final total: {min(final_tiles)}")
 
         self.optimal_came_from = {}
 
-        if final_tiles[0] < final_tiles[1]:
-            parity = 0
-        else:
-            parity = 1
-
         # Construct the optimal path, without the irrelevant parity
+        state = final_states[0] if final_tiles[0] < final_tiles[1] else final_states[1]
         node = (self.n_rows - 1, self.n_cols - 1)
         while node != (0, 0):
-            prev_node_parity = self.came_from[(node[0], node[1], parity)]
-            self.optimal_came_from[node] = (prev_node_parity[0], prev_node_parity[1])
+            state = int(self.came_from[state])
+            self.optimal_came_from[node] = divmod(state >> 1, self.n_cols)
             node = self.optimal_came_from[node]
-            parity = (parity + 1) % 2
 
         return self.optimal_came_from
 
@@ -181,3 +210,124 @@ class PathFinder:
         )
 
         return fig, ax
+
+
+class CrucibleRouter:
+    def __init__(self, grid: list[str]):
+        # Parse and index the grid once, for any number of route queries
+        self.grid = grid
+        self.n_rows = len(grid)
+        self.n_cols = len(grid[0])
+
+        costs, col_prefix, row_prefix = cost_prefix_sums(grid)
+        self.col_prefix = col_prefix.tolist()
+        self.row_prefix = row_prefix.tolist()
+        self.infinity = 9 * len(costs) + 1
+
+        # (end, min_step, max_step): exact remaining cost from every state
+        self.heuristics = {}
+
+    def _segment_cost(self, row: int, col: int, new_row: int, new_col: int) -> int:
+        # Cost of the tiles entered moving in a straight line from
+        # (row, col) to (new_row, new_col)
+        if col == new_col:
+            cell, new_cell = row * self.n_cols + col, new_row * self.n_cols + col
+            if new_row > row:
+                return (
+                    self.col_prefix[new_cell + self.n_cols]
+                    - self.col_prefix[cell + self.n_cols]
+                )
+            return self.col_prefix[cell] - self.col_prefix[new_cell]
+        else:
+            k = row * (self.n_cols + 1)
+            if new_col > col:
+                return self.row_prefix[k + new_col + 1] - self.row_prefix[k + col + 1]
+            return self.row_prefix[k + col] - self.row_prefix[k + new_col]
+
+    def _moves(self, row: int, col: int, parity: int, min_step: int, max_step: int):
+        # Tiles reachable in one move - along a column for parity 0,
+        # along a row for parity 1
+        for i in [*range(-max_step, -min_step + 1), *range(min_step, max_step + 1)]:
+            if parity == 0 and 0 <= row + i < self.n_rows:
+                yield row + i, col
+            elif parity == 1 and 0 <= col + i < self.n_cols:
+                yield row, col + i
+
+    def heuristic(self, end: tuple[int], min_step: int, max_step: int) -> list[int]:
+        # Exact cost from every (row, col, parity) state to end, by Dijkstra
+        # over the reversed moves (bucket queue, as edge costs are bounded)
+        # Cached, so repeated queries to the same end are nearly free
+        key = (end, min_step, max_step)
+        if key in self.heuristics:
+            return self.heuristics[key]
+
+        n_cols = self.n_cols
+        n_buckets = 9 * max_step + 1
+        h = 2 * self.n_rows * n_cols * [self.infinity]
+        buckets = [[] for _ in range(n_buckets)]
+
+        for parity in [0, 1]:
+            state = (end[0] * n_cols + end[1]) * 2 + parity
+            h[state] = 0
+            buckets[0].append(state)
+        n_queued = 2
+
+        d = 0
+        while n_queued > 0:
+            bucket = buckets[d % n_buckets]
+            while bucket:
+                state = bucket.pop()
+                n_queued -= 1
+                if h[state] != d:
+                    continue
+
+                # A state with the other parity moves onto this one
+                row, col = divmod(state >> 1, n_cols)
+                parity = 1 - (state & 1)
+                for new_row, new_col in self._moves(
+                    row, col, parity, min_step, max_step
+                ):
+                    previous = (new_row * n_cols + new_col) * 2 + parity
+                    cost = d + self._segment_cost(new_row, new_col, row, col)
+                    if cost < h[previous]:
+                        h[previous] = cost
+                        buckets[cost % n_buckets].append(previous)
+                        n_queued += 1
+            d += 1
+
+        self.heuristics[key] = h
+        return h
+
+    def route(
+        self,
+        start: tuple[int] = (0, 0),
+        end: tuple[int] = None,
+        min_step: int = 1,
+        max_step: int = 3,
+    ) -> tuple[int, list[tuple[int]]]:
+        # Minimal heat loss from start to end, and the tiles where the
+        # crucible turns. With an exact heuristic, A* never has to branch:
+        # from each state, take any move that keeps g + h equal to the optimum
+        end = end or (self.n_rows - 1, self.n_cols - 1)
+        h = self.heuristic(end, min_step, max_step)
+
+        start_cell = start[0] * self.n_cols + start[1]
+        state = min([start_cell * 2, start_cell * 2 + 1], key=lambda s: h[s])
+        best = h[state]
+        if best >= self.infinity:
+            raise ValueError("No valid path!")
+
+        path = [start]
+        remaining = best
+        while path[-1] != end:
+            row, col, parity = *path[-1], state & 1
+            for new_row, new_col in self._moves(row, col, parity, min_step, max_step):
+                new_state = (new_row * self.n_cols + new_col) * 2 + 1 - parity
+                cost = self._segment_cost(row, col, new_row, new_col)
+                if cost + h[new_state] == remaining:
+                    remaining -= cost
+                    state = new_state
+                    path.append((new_row, new_col))
+                    break
+
+        return best, path
@@ -1,3 +1,4 @@
+from typing import Iterable, Iterator
 import numpy as np
 from matplotlib.patches import Polygon
 import matplotlib.pyplot as plt
@@ -47,7 +48,8 @@ def shoelace_compute(vertices: list[tuple[int]]) -> int:
         area += vertex_1[0] * vertex_2[1] - vertex_1[1] * vertex_2[0]
 
     # Area will be negative if boundary is traversed clockwise
-    return int(abs(area / 2))
+    # Integer division, to stay exact for huge coordinates
+    return abs(area) // 2
 
 
 def convert_colour_to_step(colour_string: str) -> tuple[str, int]:
@@ -56,3 +58,78 @@ def convert_colour_to_step(colour_string: str) -> tuple[str, int]:
     direction = {"0": "R", "1": "D", "2": "L", "3": "U"}[direction]
 
     return direction, n
+
+
+# (row, col) change for one step in each direction
+DIRECTIONS = {"R": (0, 1), "L": (0, -1), "D": (1, 0), "U": (-1, 0)}
+
+
+class DigAccumulator:
+    def __init__(self):
+        # Running shoelace sum (twice the signed area) and boundary count,
+        # updated one dig step at a time in exact integers
+        self.position = (0, 0)
+        self.twice_area = 0
+        self.n_boundary = 0
+
+    def add_step(self, direction: str, n: int):
+        n = int(n)
+        row, col = self.position
+        d_row, d_col = DIRECTIONS[direction]
+
+        # Shoelace term for the edge from (row, col) to the new vertex
+        # row * (col + n d_col) - col * (row + n d_row)
+        self.twice_area += n * (row * d_col - col * d_row)
+        self.n_boundary += n
+        self.position = (row + n * d_row, col + n * d_col)
+
+    @property
+    def area(self) -> int:
+        return abs(self.twice_area) // 2
+
+    @property
+    def lagoon_size(self) -> int:
+        # Pick's theorem: interior points + boundary points
+        assert self.position == (0, 0), "Dig plan must be a closed loop!"
+        return self.area + self.n_boundary // 2 + 1
+
+
+def hex_steps(steps: Iterable[list[str]]) -> Iterator[tuple[str, int]]:
+    # Lazily decode the colour of each processed step into a dig step
+    for step in steps:
+        yield convert_colour_to_step(step[2])
+
+
+def streaming_lagoon_size(steps: Iterable[tuple[str, int]]) -> int:
+    # Lagoon size from a (possibly lazy) stream of dig steps, in O(1) memory
+    accumulator = DigAccumulator()
+    for step in steps:
+        accumulator.add_step(step[0], step[1])
+    return accumulator.lagoon_size
+
+
+def vectorised_lagoon_size(steps: list[tuple[str, int]]) -> int:
+    # Lagoon size for an in-memory dig plan, using NumPy. Falls back to the
+    # exact streaming accumulator if the shoelace sum could overflow int64
+    lengths = [int(step[1]) for step in steps]
+
+    # Coordinates themselves must fit, as well as the shoelace terms - checked
+    # on the Python ints, before anything is converted to int64
+    if len(steps) == 0 or sum(abs(length) for length in lengths) >= 2**62:
+        return streaming_lagoon_size(steps)
+
+    moves = np.array([DIRECTIONS[step[0]] for step in steps], dtype=np.int64)
+    n = np.array(lengths, dtype=np.int64)
+
+    # Vertices before each step
+    deltas = moves * n[:, None]
+    vertices = np.cumsum(deltas, axis=0) - deltas
+
+    # Bound on every shoelace term, computed in floats so it can't overflow
+    bound = (np.abs(vertices).astype(np.float64) * np.abs(deltas)[:, ::-1]).sum()
+    if bound >= 2**62:
+        return streaming_lagoon_size(steps)
+
+    assert not deltas.sum(axis=0).any(), "Dig plan must be a closed loop!"
+    twice_area = (vertices[:, 0] * deltas[:, 1] - vertices[:, 1] * deltas[:, 0]).sum()
+    return abs(int(twice_area)) // 2 + int(n.sum()) // 2 + 1
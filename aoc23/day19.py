@@ -1,8 +1,9 @@
 from dataclasses import dataclass
+import math
 import operator
 from dataclasses import field
-from copy import deepcopy
 from itertools import combinations
+import numpy as np
 
 
 @dataclass(frozen=True)
@@ -163,63 +164,121 @@ class Region:
             )
 
 
+# Regions as immutable packed tuples of inclusive limits:
+# (x_min, x_max, m_min, m_max, a_min, a_max, s_min, s_max)
+FULL_REGION = (1, 4000) * 4
+
+
+def split_region(region: tuple[int], condition: Condition) -> tuple[tuple[int]]:
+    # Split a packed region into the parts that do and don't satisfy the
+    # condition, without copying anything mutable. Empty parts are None
+    idx = 2 * "xmas".index(condition.variable)
+    lower, upper = region[idx], region[idx + 1]
+
+    if condition.relation == "<":
+        satisfied = (lower, min(upper, condition.value - 1))
+        unsatisfied = (max(lower, condition.value), upper)
+    else:
+        satisfied = (max(lower, condition.value + 1), upper)
+        unsatisfied = (lower, min(upper, condition.value))
+
+    return tuple(
+        region[:idx] + limits + region[idx + 2 :] if limits[0] <= limits[1] else None
+        for limits in (satisfied, unsatisfied)
+    )
+
+
+def region_volume(region: tuple[int]) -> int:
+    return math.prod(region[i + 1] - region[i] + 1 for i in range(0, 8, 2))
+
+
+def _unpack_region(region: tuple[int], accepted: str) -> Region:
+    # Convert a packed region back into a Region
+    limits = {v: list(region[2 * i : 2 * i + 2]) for i, v in enumerate("xmas")}
+    return Region(accepted=accepted, **limits)
+
+
+def _workflow_branches(
+    workflow: list[list[Condition, str]], region: tuple[int]
+) -> list[tuple[str, tuple[int]]]:
+    # The (name, region) pairs a region is split into by one workflow
+    branches = []
+    for rule in workflow:
+        if len(rule) == 1:
+            # End of workflow - everything left moves on
+            branches.append((rule[0], region))
+            break
+
+        condition, name = rule
+        satisfied, region = split_region(region, condition)
+        if satisfied is not None:
+            branches.append((name, satisfied))
+        if region is None:
+            break
+
+    return branches
+
+
 def compute_regions(workflows: dict[str, list[list[Condition, str]]]) -> list[Region]:
     regions = []
 
     # Start with a single, maximal range at the 'in' workflow
-    states = [("in", Region())]
+    states = [("in", FULL_REGION)]
 
     while len(states) != 0:
-        # Take the most recently added state
-        state = states.pop()
-        name, region = state
-
-        workflow = workflows[name]
-
-        for rule in workflow:
-            if len(rule) == 2:
-                condition, name = rule
-                # There are 2 cases - the rule is/is not satified
-                # Make a copy for later
-                skip_region = deepcopy(region)
-
-                # Case 1 - condition satisfied
-                # Reset the limits of the region, based on the condition
-                if condition.relation == "<":
-                    region.set_upper_limit(condition.variable, condition.value - 1)
-                elif condition.relation == ">":
-                    region.set_lower_limit(condition.variable, condition.value + 1)
-
-                # Add the completed region to regions,
-                # or add new state to stack
-                if name in ["A", "R"]:
-                    region.accepted = name
-                    regions.append(region)
-                else:
-                    states.append((name, region))
-
-                # Case 2 - condition not satisfied
-                if condition.relation == ">":
-                    skip_region.set_upper_limit(condition.variable, condition.value)
-                elif condition.relation == "<":
-                    skip_region.set_lower_limit(condition.variable, condition.value)
-
-                # Redefine region, to use as input for next rule in loop
-                region = skip_region
-
+        # Take the most recently added state, and split it up
+        name, region = states.pop()
+
+        for name, region in _workflow_branches(workflows[name], region):
+            # Add the completed region to regions,
+            # or add new state to stack
+            if name in ["A", "R"]:
+                regions.append(_unpack_region(region, name))
             else:
-                # End of workflow
-                # Either terminate or add new state to stack
-                name = rule[0]
-                if name in ["A", "R"]:
-                    region.accepted = name
-                    regions.append(region)
-                else:
-                    states.append((name, region))
+                states.append((name, region))
 
     return regions
 
 
+def accepted_volume(
+    workflows: dict[str, list[list[Condition, str]]],
+    region: tuple[int] = FULL_REGION,
+) -> int:
+    # Number of accepted parts in region. The volume for each (workflow,
+    # region) pair is memoized, so it is only explored once however many
+    # times it is reached. Iterative, so deep chains of workflows are fine
+    volumes = {}
+    stack = [("in", region)]
+
+    while len(stack) != 0:
+        name, region = stack[-1]
+        if (name, region) in volumes:
+            stack.pop()
+            continue
+
+        branches = _workflow_branches(workflows[name], region)
+        missing = [
+            branch
+            for branch in branches
+            if branch[0] not in ["A", "R"] and branch not in volumes
+        ]
+        if missing:
+            # Work out the sub-workflows first, then come back to this one
+            stack.extend(missing)
+            continue
+
+        volume = 0
+        for branch in branches:
+            if branch[0] == "A":
+                volume += region_volume(branch[1])
+            elif branch[0] != "R":
+                volume += volumes[branch]
+        volumes[(name, region)] = volume
+        stack.pop()
+
+    return volumes[("in", region)]
+
+
 def count_parts(regions: list[Region], state: str):
     regions = [region for region in regions if region.accepted == state]
     return sum([region.count_parts() for region in regions])
@@ -241,3 +300,90 @@ def intersect_regions(region_1: Region, region_2: Region) -> Region:
         a=_intersect_intervals(region_1.a, region_2.a),
         s=_intersect_intervals(region_1.s, region_2.s),
     )
+
+
+def compile_workflows(workflows: dict[str, list[list[Condition, str]]]):
+    # Compile every workflow once into a closure over (x, m, a, s) tuples,
+    # returning the name of the next workflow, so evaluating a part needs no
+    # getattr, OPERATORS lookup or len(rule) checks. Parts are dispatched
+    # between workflows in a loop, so long chains can't hit the recursion
+    # limit. Returns a function part -> accepted
+    def compile_rules(rules: list[list[Condition, str]]):
+        checks = tuple(
+            (
+                "xmas".index(condition.variable),
+                condition.relation,
+                condition.value,
+                name,
+            )
+            for condition, name in rules[:-1]
+        )
+        default = rules[-1][0]
+
+        def workflow(values):
+            for idx, relation, value, name in checks:
+                if values[idx] < value if relation == "<" else values[idx] > value:
+                    return name
+            return default
+
+        return workflow
+
+    compiled = {name: compile_rules(rules) for name, rules in workflows.items()}
+
+    def accept(part: Part) -> bool:
+        values = (part.x, part.m, part.a, part.s)
+        name = "in"
+        while name not in ["A", "R"]:
+            name = compiled[name](values)
+        return name == "A"
+
+    return accept
+
+
+def accepted_mask(
+    workflows: dict[str, list[list[Condition, str]]],
+    x: np.ndarray,
+    m: np.ndarray,
+    a: np.ndarray,
+    s: np.ndarray,
+) -> np.ndarray:
+    # Columnar evaluation: push index arrays of parts through the workflows,
+    # splitting them with a boolean mask at each rule
+    values = {
+        "x": np.asarray(x),
+        "m": np.asarray(m),
+        "a": np.asarray(a),
+        "s": np.asarray(s),
+    }
+    accepted = np.zeros(len(values["x"]), dtype=bool)
+
+    states = [("in", np.arange(len(accepted)))]
+    while len(states) != 0:
+        name, idx = states.pop()
+        if len(idx) == 0 or name == "R":
+            continue
+        if name == "A":
+            accepted[idx] = True
+            continue
+
+        for rule in workflows[name]:
+            if len(rule) == 1:
+                # End of workflow - everything left moves on
+                states.append((rule[0], idx))
+                break
+
+            condition, new_name = rule
+            column = values[condition.variable][idx]
+            if condition.relation == "<":
+                mask = column < condition.value
+            else:
+                mask = column > condition.value
+            states.append((new_name, idx[mask]))
+            idx = idx[~mask]
+
+    return accepted
+
+
+def parts_to_columns(parts: list[Part]) -> tuple[np.ndarray]:
+    # x, m, a and s values of every part, as separate arrays
+    return tuple(np.array([getattr(part, v) for part in parts]) for v in "xmas")
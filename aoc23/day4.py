@@ -1,3 +1,7 @@
+from collections import deque
+from typing import Iterable
+
+
 def process_input_4(input_4: list[str]) -> list[tuple[list[int]]]:
     processed_input = []
     for line in input_4:
@@ -23,16 +27,83 @@ def scratchcard_score(n_matches: int) -> int:
 
 
 def final_card_number(matches: list[int]) -> int:
-    # Initialise the card numbers - 1 of each card:
+    # Running difference array: card i adds card_numbers[i] copies to the
+    # whole block of cards i+1..i+n_matches, so record +copies at the
+    # start of the block and -copies just after it, rather than
+    # looping over the block
     n_cards = len(matches)
-    card_numbers = n_cards * [1]
+    differences = (n_cards + 1) * [0]
 
+    running = 0
+    total = 0
     for i in range(n_cards):
-        n_matches = matches[i]
-        for j in range(n_matches):
-            # Add card_numbers[i] new copies of the next n_matches cards
-            # Check that we aren't going off the end of the cards too
-            if i + 1 + j < n_cards:
-                card_numbers[i + 1 + j] += card_numbers[i]
-
-    return sum(card_numbers)
+        running += differences[i]
+        # 1 original card, plus the copies won from earlier cards
+        copies = 1 + running
+        total += copies
+
+        # Check that we aren't going off the end of the cards too
+        end = min(i + 1 + matches[i], n_cards)
+        if end > i + 1:
+            differences[i + 1] += copies
+            differences[end] -= copies
+
+    return total
+
+
+def card_masks(line: str) -> tuple[int]:
+    # Encode the winning numbers and my numbers as integer bitmasks,
+    # with bit k set if k is one of the numbers
+    numbers = line.split(":")[1]
+    winning_numbers, my_numbers = numbers.split(" | ")
+    return _numbers_to_mask(winning_numbers.split()), _numbers_to_mask(
+        my_numbers.split()
+    )
+
+
+def _numbers_to_mask(numbers: list[str]) -> int:
+    mask = 0
+    for n in numbers:
+        mask |= 1 << int(n)
+    return mask
+
+
+def process_input_4_masks(input_4: list[str]) -> list[tuple[int]]:
+    return [card_masks(line) for line in input_4]
+
+
+def mask_matches(winning_mask: int, my_mask: int) -> int:
+    # Matching numbers are the common set bits - a single popcount
+    return (winning_mask & my_mask).bit_count()
+
+
+def stream_scratchcards(lines: Iterable[str]) -> tuple[int]:
+    # Process cards lazily (e.g. straight from an open file), returning
+    # (total score, final number of cards). Only the pending copy
+    # differences for the next few cards are kept, so memory is bounded
+    # by the largest number of matches rather than the number of cards
+    differences = deque()
+
+    running = 0
+    total_score = 0
+    total_cards = 0
+    for line in lines:
+        line = line.strip()
+        if line == "":
+            continue
+
+        n_matches = mask_matches(*card_masks(line))
+        total_score += scratchcard_score(n_matches)
+
+        running += differences.popleft() if differences else 0
+        copies = 1 + running
+        total_cards += copies
+
+        # Window must cover the block of cards following this one
+        if n_matches > 0:
+            while len(differences) <= n_matches:
+                differences.append(0)
+            differences[0] += copies
+            differences[n_matches] -= copies
+
+    return total_score, total_cards
@@ -1,3 +1,5 @@
+import math
+from bisect import bisect_right
 import numpy as np
 
 
@@ -42,7 +44,183 @@ def seed_location(seed_idx: int, maps: dict[str, list[list[int]]]) -> int:
 
 
 def is_valid_seed(candidate: int, seed_pairs: np.ndarray) -> bool:
+    # Use the bisect-based index if one has already been built
+    if isinstance(seed_pairs, SeedIndex):
+        return candidate in seed_pairs
+
     for lower, n in seed_pairs:
         if lower <= candidate < lower + n:
             return True
     return False
+
+
+def _map_to_arrays(map_ranges: list[list[int]]) -> tuple[np.ndarray]:
+    # Sorted, disjoint source starts, with matching source ends and offsets
+    # Built from map_to_pieces, so overlapping rows resolve as in seed_location
+    pieces = [piece for piece in map_to_pieces(map_ranges) if piece[2] != 0]
+    rows = np.array(pieces, dtype=np.int64).reshape(-1, 3)
+    return rows[:, 0], rows[:, 1], rows[:, 2]
+
+
+def seed_locations(seeds: np.ndarray, maps: dict[str, list[list[int]]]) -> np.ndarray:
+    # Batch version of seed_location - map a whole array of seeds through
+    # each stage at once, rather than one seed at a time
+    values = np.asarray(seeds, dtype=np.int64)
+
+    for key in maps:
+        sources, ends, offsets = _map_to_arrays(maps[key])
+        if len(sources) == 0:
+            continue
+
+        # Index of the last piece starting at or before each value
+        idx = np.searchsorted(sources, values, side="right") - 1
+        clipped = np.maximum(idx, 0)
+
+        # Values outside every piece map to themselves
+        in_range = (idx >= 0) & (values < ends[clipped])
+        values = values + np.where(in_range, offsets[clipped], 0)
+
+    return values
+
+
+class SeedIndex:
+    def __init__(self, seed_pairs: np.ndarray):
+        # Sort the (lower, n) pairs and merge any overlaps, so that
+        # membership is a single bisect over disjoint [start, end) intervals
+        self.starts = []
+        self.ends = []
+
+        for lower, n in sorted((int(lower), int(n)) for lower, n in seed_pairs):
+            if n <= 0:
+                continue
+            if self.ends and lower <= self.ends[-1]:
+                self.ends[-1] = max(self.ends[-1], lower + n)
+            else:
+                self.starts.append(lower)
+                self.ends.append(lower + n)
+
+    def __contains__(self, candidate: int) -> bool:
+        i = bisect_right(self.starts, candidate) - 1
+        return i >= 0 and candidate < self.ends[i]
+
+    def contains(self, candidates: np.ndarray) -> np.ndarray:
+        # Vectorised membership test for an array of candidates
+        candidates = np.asarray(candidates, dtype=np.int64)
+        starts = np.array(self.starts, dtype=np.int64)
+        ends = np.array(self.ends, dtype=np.int64)
+        if len(starts) == 0:
+            return np.zeros(candidates.shape, dtype=bool)
+
+        idx = np.searchsorted(starts, candidates, side="right") - 1
+        return (idx >= 0) & (candidates < ends[np.maximum(idx, 0)])
+
+
+def map_to_pieces(map_ranges: list[list[int]]) -> list[tuple[int]]:
+    # Convert a list of [destination, source, n] rows into a sorted
+    # piecewise-linear function, stored as (start, end, offset) pieces
+    # covering [0, inf). Gaps between the rows map to themselves (offset 0)
+    # Like seed_location, the first row containing a value wins, so each row
+    # only claims the parts of its range not already claimed by earlier rows
+    claimed = []
+    for destination, source, n in map_ranges:
+        lower, upper = source, source + n
+        for start, end, _ in sorted(claimed):
+            if lower >= upper:
+                break
+            if start > lower:
+                claimed.append((lower, min(upper, start), destination - source))
+            lower = max(lower, end)
+        if lower < upper:
+            claimed.append((lower, upper, destination - source))
+
+    pieces = []
+    position = 0
+    for start, end, offset in sorted(claimed):
+        if start > position:
+            pieces.append((position, start, 0))
+        pieces.append((start, end, offset))
+        position = end
+
+    pieces.append((position, math.inf, 0))
+
+    return _merge_pieces(pieces)
+
+
+def _merge_pieces(pieces: list[tuple[int]]) -> list[tuple[int]]:
+    # Join neighbouring pieces sharing an offset, and drop empty pieces,
+    # to keep the number of pieces as small as possible
+    merged = []
+    for start, end, offset in pieces:
+        if start >= end:
+            continue
+        if merged and merged[-1][1] == start and merged[-1][2] == offset:
+            merged[-1] = (merged[-1][0], end, offset)
+        else:
+            merged.append((start, end, offset))
+    return merged
+
+
+def _overlapping_pieces(
+    lower: int, upper: int, pieces: list[tuple[int]], starts: list[int]
+):
+    # Yield the (start, end, offset) parts of pieces that overlap [lower, upper)
+    # Pieces are sorted and contiguous, so bisect their starts to find the first
+    i = max(bisect_right(starts, lower) - 1, 0)
+
+    while i < len(pieces) and pieces[i][0] < upper:
+        start, end, offset = pieces[i]
+        if end > lower:
+            yield max(start, lower), min(end, upper), offset
+        i += 1
+
+
+def compose_pieces(
+    first: list[tuple[int]], second: list[tuple[int]]
+) -> list[tuple[int]]:
+    # Piecewise-linear function equal to applying `first`, then `second`
+    composed = []
+    starts = [piece[0] for piece in second]
+
+    for start, end, offset in first:
+        # The image of this piece is [start + offset, end + offset) - split it
+        # up by the pieces of `second` it overlaps, then shift back to the domain
+        for lower, upper, next_offset in _overlapping_pieces(
+            start + offset, end + offset, second, starts
+        ):
+            composed.append((lower - offset, upper - offset, offset + next_offset))
+
+    return _merge_pieces(sorted(composed))
+
+
+def compose_maps(maps: dict[str, list[list[int]]]) -> list[tuple[int]]:
+    # Compose every map (in order) into a single seed -> location function
+    pieces = [(0, math.inf, 0)]
+    for key in maps:
+        pieces = compose_pieces(pieces, map_to_pieces(maps[key]))
+    return pieces
+
+
+def map_intervals(
+    intervals: list[tuple[int]], pieces: list[tuple[int]]
+) -> list[tuple[int]]:
+    # Push half-open [lower, upper) intervals through a piecewise-linear
+    # function, returning the (unsorted) image intervals
+    starts = [piece[0] for piece in pieces]
+    return [
+        (lower + offset, upper + offset)
+        for interval in intervals
+        for lower, upper, offset in _overlapping_pieces(*interval, pieces, starts)
+    ]
+
+
+def lowest_location_range(seeds: list[int], maps: dict[str, list[list[int]]]) -> int:
+    # Seeds come in (lower, n) pairs, each defining a whole range of seeds
+    intervals = [
+        (lower, lower + n) for lower, n in zip(seeds[::2], seeds[1::2]) if n > 0
+    ]
+    if len(intervals) == 0:
+        raise ValueError("No seeds - every seed range is empty!")
+    locations = map_intervals(intervals, compose_maps(maps))
+
+    # Each image interval is increasing, so its lowest location is its start
+    return min(lower for lower, _ in locations)
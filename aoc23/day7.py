@@ -1,6 +1,12 @@
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, field
 from functools import total_ordering
 from collections import defaultdict
+from functools import cache
+from heapq import merge
+from tempfile import TemporaryDirectory
+from typing import Iterable, Iterator
+import numpy as np
 
 CARDS = {
     "A": 14,
@@ -22,14 +28,11 @@ CARDS = {
 HAND_TYPES = {"5K": 7, "4K": 6, "FH": 5, "3K": 4, "2P": 3, "1P": 2, "HC": 1}
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 @total_ordering
 class Card:
     label: str
 
-    def __post_init__(self):
-        assert self.label in CARDS.keys()
-
     def __lt__(self, other):
         return CARDS[self.label] < CARDS[other.label]
 
@@ -37,74 +40,227 @@ class Card:
         return self.label
 
 
+def classify_hand(hand_str: str, joker_label: str = "-") -> str:
+    card_count = defaultdict(int)
+    num_joker = 0
+
+    for label in hand_str:
+        if label == joker_label:
+            num_joker += 1
+        else:
+            card_count[label] += 1
+
+    sorted_counts = sorted(card_count.values())
+    if len(sorted_counts) == 0:
+        return "5K"
+
+    sorted_counts[-1] += num_joker
+
+    match sorted_counts:
+        case [5]:
+            return "5K"
+        case [1, 4]:
+            return "4K"
+        case [2, 3]:
+            return "FH"
+        case [1, 1, 3]:
+            return "3K"
+        case [1, 2, 2]:
+            return "2P"
+        case [1, 1, 1, 2]:
+            return "1P"
+        case [1, 1, 1, 1, 1]:
+            return "HC"
+
+
+def hand_key(hand_str: str, joker_label: str = "-") -> int:
+    # Pack the hand into a single integer: the type rank in the top bits,
+    # then the rank of each card in 4 bits each (jokers rank lowest, as "-")
+    # Comparing keys is then the same as comparing hands
+    key = HAND_TYPES[classify_hand(hand_str, joker_label)]
+    for label in hand_str:
+        key = (key << 4) | (CARDS["-"] if label == joker_label else CARDS[label])
+    return key
+
+
 @total_ordering
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Hand:
     hand_str: str
     joker_label: str = "-"
+    # Classified once, at construction
+    hand_type: str = field(init=False, repr=False, compare=False)
+    key: int = field(init=False, repr=False, compare=False)
 
     def __post_init__(self):
-        assert len(self.hand_str) == 5
-        for c in self.hand_str:
-            assert c in CARDS, "element of hand_str must be in CARDS!"
-        object.__setattr__(self, "cards", [Card(i) for i in self.hand_str])
-        object.__setattr__(self, "joker", Card(self.joker_label))
+        if len(self.hand_str) != 5:
+            raise ValueError("hand_str must contain 5 cards!")
+        object.__setattr__(
+            self, "hand_type", classify_hand(self.hand_str, self.joker_label)
+        )
+        object.__setattr__(self, "key", hand_key(self.hand_str, self.joker_label))
 
     @property
-    def hand_type(self):
-        card_count = defaultdict(int)
-        num_joker = 0
-
-        for card in self.cards:
-            if card == self.joker:
-                num_joker += 1
-            else:
-                card_count[card] += 1
-
-        sorted_counts = sorted(card_count.values())
-        if len(sorted_counts) == 0:
-            return "5K"
+    def cards(self):
+        return [Card(i) for i in self.hand_str]
 
-        sorted_counts[-1] += num_joker
-
-        match sorted_counts:
-            case [5]:
-                return "5K"
-            case [1, 4]:
-                return "4K"
-            case [2, 3]:
-                return "FH"
-            case [1, 1, 3]:
-                return "3K"
-            case [1, 2, 2]:
-                return "2P"
-            case [1, 1, 1, 2]:
-                return "1P"
-            case [1, 1, 1, 1, 1]:
-                return "HC"
+    @property
+    def joker(self):
+        return Card(self.joker_label)
 
     def __lt__(self, other):
-        if self.hand_type != other.hand_type:
-            return HAND_TYPES[self.hand_type] < HAND_TYPES[other.hand_type]
-        else:
-            for card_1, card_2 in zip(self.cards, other.cards):
-                match (card_1 == self.joker, card_2 == other.joker):
-                    case (True, False):
-                        return True
-                    case (False, True):
-                        return False
-                    case (False, False):
-                        if card_1 < card_2:
-                            return True
-                        elif card_1 > card_2:
-                            return False
-            return False
+        return self.key < other.key
 
     def __eq__(self, other):
-        for card_1, card_2 in zip(self.cards, other.cards):
-            if card_1 == self.joker and card_2 == other.joker:
+        return self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+# Order of the 13 real card labels, used to encode hands as base-13 integers
+LABELS = "23456789TJQKA"
+
+
+def encode_hands(hand_strs: list[str]) -> np.ndarray:
+    # Encode each 5-card hand as an integer in [0, 13^5), with the first
+    # card as the most significant base-13 digit
+    lookup = np.full(256, -1, dtype=np.int64)
+    for i, label in enumerate(LABELS):
+        lookup[ord(label)] = i
+
+    if any(len(hand_str) != 5 for hand_str in hand_strs):
+        raise ValueError("hand_str must contain 5 cards!")
+
+    raw = np.frombuffer("".join(hand_strs).encode(), dtype=np.uint8)
+    digits = lookup[raw].reshape(-1, 5)
+    if (digits < 0).any():
+        raise ValueError("element of hand_str must be in LABELS!")
+
+    return digits @ (13 ** np.arange(4, -1, -1))
+
+
+@cache
+def build_key_table(joker_label: str = "-") -> np.ndarray:
+    # Integer key (as in hand_key) for every one of the 13^5 encoded hands
+    codes = np.arange(13**5)
+    digits = (codes[:, None] // (13 ** np.arange(4, -1, -1))) % 13
+
+    # Count each label in each hand, and set the jokers aside
+    counts = np.zeros((len(codes), 13), dtype=np.int64)
+    np.add.at(counts, (np.repeat(codes, 5), digits.ravel()), 1)
+    num_joker = np.zeros(len(codes), dtype=np.int64)
+    if joker_label in LABELS:
+        num_joker = counts[:, LABELS.index(joker_label)].copy()
+        counts[:, LABELS.index(joker_label)] = 0
+
+    # Largest two counts decide the type - jokers join the largest
+    sorted_counts = np.sort(counts, axis=1)
+    first = sorted_counts[:, -1] + num_joker
+    second = sorted_counts[:, -2]
+
+    types = np.select(
+        [
+            first == 5,
+            first == 4,
+            (first == 3) & (second == 2),
+            first == 3,
+            (first == 2) & (second == 2),
+            first == 2,
+        ],
+        [HAND_TYPES[t] for t in ["5K", "4K", "FH", "3K", "2P", "1P"]],
+        default=HAND_TYPES["HC"],
+    )
+
+    # Card ranks, with jokers ranked lowest
+    ranks = np.array([CARDS[label] for label in LABELS])
+    if joker_label in LABELS:
+        ranks[LABELS.index(joker_label)] = CARDS["-"]
+
+    keys = types
+    for i in range(5):
+        keys = (keys << 4) | ranks[digits[:, i]]
+
+    return keys
+
+
+def hand_keys(codes: np.ndarray, joker_label: str = "-") -> np.ndarray:
+    # Classify and rank a whole array of encoded hands in one gather
+    return build_key_table(joker_label)[codes]
+
+
+def total_winnings(
+    hand_strs: list[str], bids: np.ndarray, joker_label: str = "-"
+) -> int:
+    keys = hand_keys(encode_hands(hand_strs), joker_label)
+    bids = np.asarray(bids, dtype=np.int64)
+
+    # Rank 1 for the weakest hand, up to n for the strongest
+    # Equal hands are ordered by bid, as in external_total_winnings
+    order = np.lexsort((bids, keys))
+    ranks = np.arange(1, len(keys) + 1)
+    return int((bids[order] * ranks).sum())
+
+
+def _write_run(keys: np.ndarray, bids: np.ndarray, directory: str) -> str:
+    # Sort one run of (key, bid) pairs and write it to disk as raw int64s
+    # Equal keys are ordered by bid, to match the tuple order used by merge
+    order = np.lexsort((bids, keys))
+    run = np.stack([keys[order], bids[order]], axis=1).astype(np.int64)
+
+    path = os.path.join(directory, f"run_{len(os.listdir(directory))}.bin")
+    run.tofile(path)
+    return path
+
+
+def _read_run(path: str, chunk_size: int) -> Iterator[tuple[int]]:
+    # Stream (key, bid) pairs back from a sorted run, one chunk at a time
+    with open(path, "rb") as f:
+        while True:
+            chunk = np.fromfile(f, dtype=np.int64, count=2 * chunk_size)
+            if len(chunk) == 0:
+                return
+            yield from map(tuple, chunk.reshape(-1, 2).tolist())
+
+
+def external_total_winnings(
+    lines: Iterable[str],
+    joker_label: str = "-",
+    run_size: int = 1_000_000,
+    chunk_size: int = 10_000,
+    directory: str = None,
+) -> int:
+    # Total winnings for a hand/bid file too large to sort in memory.
+    # Hands are encoded into keys and written out in sorted runs of at most
+    # run_size, which are then k-way merged to sum rank * bid. Peak memory
+    # is one run while writing, and one chunk per run while merging
+    table = build_key_table(joker_label)
+
+    with TemporaryDirectory(dir=directory) as tmp:
+        paths = []
+        hands, bids = [], []
+
+        for line in lines:
+            line = line.strip()
+            if line == "":
                 continue
-            elif card_1 != card_2:
-                return False
+            hand, bid = line.split()
+            hands.append(hand)
+            bids.append(int(bid))
+
+            if len(hands) == run_size:
+                paths.append(
+                    _write_run(table[encode_hands(hands)], np.array(bids), tmp)
+                )
+                hands, bids = [], []
+
+        if hands:
+            paths.append(_write_run(table[encode_hands(hands)], np.array(bids), tmp))
+
+        # Merged pairs arrive weakest first, so rank counts up from 1
+        runs = [_read_run(path, chunk_size) for path in paths]
+        total = 0
+        for rank, (_, bid) in enumerate(merge(*runs), start=1):
+            total += rank * bid
 
-        return True
+    return total
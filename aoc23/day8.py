@@ -1,11 +1,19 @@
+from dataclasses import dataclass
+import math
+import numpy as np
+
+
 def compute_visited(start_node, instructions, maps):
     # Computes the list of (node, instruction_index) states, starting from start_node,
     # as well as the the first repeated element of the list (defining the start
     # of the cycle)
+    # Membership is checked against a set of seen states, not the list
     visited = []
+    seen = set()
     state = (start_node, 0)
     instruction_idx = 0
-    while state not in visited:
+    while state not in seen:
+        seen.add(state)
         visited.append(state)
         instruction_idx = (instruction_idx + 1) % len(instructions)
         state = (maps[state[0]][instructions[state[1]]], instruction_idx)
@@ -22,3 +30,198 @@ def num_steps(node, instructions, maps):
             if node[2] == "Z":
                 break
     return steps
+
+
+@dataclass(frozen=True)
+class Network:
+    names: list[str]
+    index: dict[str, int]
+    left: np.ndarray  # int32 successor for an L instruction
+    right: np.ndarray  # int32 successor for an R instruction
+    instructions: np.ndarray  # 0 for L, 1 for R
+    is_end: np.ndarray  # True for nodes ending in Z
+
+    @classmethod
+    def create(cls, instructions: str, maps: dict[str, dict[str, str]]):
+        # Intern node names as integers, in order of appearance
+        names = list(maps)
+        index = {name: i for i, name in enumerate(names)}
+
+        left = np.array([index[maps[name]["L"]] for name in names], dtype=np.int32)
+        right = np.array([index[maps[name]["R"]] for name in names], dtype=np.int32)
+
+        return cls(
+            names=names,
+            index=index,
+            left=left,
+            right=right,
+            instructions=np.array([c == "R" for c in instructions], dtype=np.int8),
+            is_end=np.array([name[-1] == "Z" for name in names], dtype=bool),
+        )
+
+    @property
+    def successors(self) -> np.ndarray:
+        # Row 0 = left successors, row 1 = right successors
+        return np.stack([self.left, self.right])
+
+
+@dataclass(frozen=True)
+class GhostCycle:
+    lead_in: int  # steps before the cycle starts
+    cycle_length: int
+    lead_in_ends: frozenset[int]  # steps < lead_in landing on an end node
+    cycle_ends: frozenset[int]  # offsets from lead_in landing on an end node
+
+    def is_end(self, steps: int) -> bool:
+        if steps < self.lead_in:
+            return steps in self.lead_in_ends
+        return (steps - self.lead_in) % self.cycle_length in self.cycle_ends
+
+
+def analyse_cycle(network: Network, start_node: str) -> GhostCycle:
+    # Walk (node, instruction_index) states until one repeats, recording the
+    # step at which each state was first seen - linear in the states visited
+    n_instructions = len(network.instructions)
+    successors = network.successors.tolist()
+    instructions = network.instructions.tolist()
+    is_end = network.is_end.tolist()
+
+    first_seen = {}
+    ends = []
+    node, idx, steps = network.index[start_node], 0, 0
+    while (node, idx) not in first_seen:
+        first_seen[(node, idx)] = steps
+        if is_end[node]:
+            ends.append(steps)
+        node = successors[instructions[idx]][node]
+        idx = (idx + 1) % n_instructions
+        steps += 1
+
+    lead_in = first_seen[(node, idx)]
+    return GhostCycle(
+        lead_in=lead_in,
+        cycle_length=steps - lead_in,
+        lead_in_ends=frozenset(t for t in ends if t < lead_in),
+        cycle_ends=frozenset(t - lead_in for t in ends if t >= lead_in),
+    )
+
+
+def crt(congruences: list[tuple[int]]) -> tuple[int] | None:
+    # Solve t = r_i (mod m_i) for every (r_i, m_i), without assuming the
+    # moduli are coprime. Returns (r, lcm) with 0 <= r < lcm, or None if
+    # the congruences are inconsistent
+    r, m = 0, 1
+    for r_i, m_i in congruences:
+        g = math.gcd(m, m_i)
+        if (r_i - r) % g != 0:
+            return None
+
+        # r + m * k = r_i (mod m_i)  =>  k = (r_i - r) / g * inv(m / g) (mod m_i / g)
+        reduced = m_i // g
+        k = (r_i - r) // g * pow(m // g, -1, reduced) % reduced
+        r, m = r + m * k, m * reduced
+        r %= m
+
+    return r, m
+
+
+def first_common_end(network: Network, start_nodes: list[str]) -> int:
+    # Smallest number of steps after which every ghost is on an end node
+    cycles = [analyse_cycle(network, node) for node in start_nodes]
+    max_lead_in = max(cycle.lead_in for cycle in cycles)
+
+    # Before every ghost is in its cycle, check each step directly
+    for steps in range(max_lead_in):
+        if all(cycle.is_end(steps) for cycle in cycles):
+            return steps
+
+    # Afterwards, each ghost contributes a choice of congruences
+    # steps = lead_in + offset (mod cycle_length) - combine them all
+    solutions = {(0, 1)}
+    for cycle in cycles:
+        new_solutions = set()
+        for r, m in solutions:
+            for offset in cycle.cycle_ends:
+                solution = crt([(r, m), (cycle.lead_in + offset, cycle.cycle_length)])
+                if solution is not None:
+                    new_solutions.add(solution)
+        solutions = new_solutions
+
+    if len(solutions) == 0:
+        raise ValueError("Ghosts never all reach an end node together!")
+
+    # Smallest solution that is at least max_lead_in
+    return min(r + -(-(max_lead_in - r) // m) * m for r, m in solutions)
+
+
+class JumpTable:
+    def __init__(self, network: Network):
+        # States are (node, instruction_index) pairs, flattened to
+        # node * n_instructions + instruction_index
+        self.network = network
+        self.n_instructions = len(network.instructions)
+        n_states = len(network.names) * self.n_instructions
+
+        states = np.arange(n_states, dtype=np.int64)
+        nodes = states // self.n_instructions
+        idx = states % self.n_instructions
+        next_nodes = network.successors[network.instructions[idx], nodes]
+
+        # jumps[k][s] = state after 2^k steps from s
+        # first_end[k][s] = first offset in [0, 2^k) from s landing on an
+        # end node, or 2^k if there is none
+        self.jumps = [
+            next_nodes.astype(np.int64) * self.n_instructions
+            + (idx + 1) % self.n_instructions
+        ]
+        self.first_end = [np.where(network.is_end[nodes], 0, 1).astype(np.int64)]
+
+    def _extend(self, n_levels: int):
+        # Build tables up to 2^(n_levels - 1) steps, doubling each time
+        while len(self.jumps) < n_levels:
+            jump, first_end = self.jumps[-1], self.first_end[-1]
+            size = 1 << (len(self.jumps) - 1)
+            self.jumps.append(jump[jump])
+            self.first_end.append(
+                np.where(first_end < size, first_end, size + first_end[jump])
+            )
+
+    def _state(self, node: str, instruction_idx: int) -> int:
+        return self.network.index[node] * self.n_instructions + instruction_idx
+
+    def advance(self, node: str, n_steps: int, instruction_idx: int = 0) -> tuple:
+        # (node, instruction_index) after n_steps, in O(log n_steps)
+        self._extend(n_steps.bit_length())
+        state = self._state(node, instruction_idx)
+
+        for k in range(n_steps.bit_length()):
+            if n_steps >> k & 1:
+                state = int(self.jumps[k][state])
+
+        return (
+            self.network.names[state // self.n_instructions],
+            state % self.n_instructions,
+        )
+
+    def first_end_within(
+        self, node: str, n_steps: int, instruction_idx: int = 0
+    ) -> int | None:
+        # Smallest t in 1..n_steps such that the node after t steps is an
+        # end node, or None if there isn't one
+        if n_steps < 1:
+            return None
+        self._extend(n_steps.bit_length())
+
+        # Take the first step, then search offsets [0, n_steps) from there
+        # Blocks of 2^k steps are checked in the order they are walked
+        state = int(self.jumps[0][self._state(node, instruction_idx)])
+        offset = 0
+        for k in range(n_steps.bit_length()):
+            if n_steps >> k & 1:
+                first_end = int(self.first_end[k][state])
+                if first_end < 1 << k:
+                    return offset + first_end + 1
+                state = int(self.jumps[k][state])
+                offset += 1 << k
+
+        return None
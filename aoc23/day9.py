@@ -9,3 +9,57 @@ def next_element(sequence):
         sequence = np.diff(sequence)
 
     return sum([diff[-1] for diff in diffs])
+
+
+def extrapolation_weights(n: int, steps: int = 1) -> list[int]:
+    # Exact integer weights w, such that sum(w * sequence) extrapolates a
+    # length-n sequence `steps` places past its last element (or, for
+    # negative steps, before its first). Repeated differencing is the
+    # same as fitting the degree n - 1 polynomial through the sequence,
+    # so these are its Lagrange coefficients at the new position
+    if steps == 0:
+        raise ValueError("steps must be non-zero!")
+    position = n - 1 + steps if steps > 0 else steps
+    if 0 <= position < n:
+        return [int(i == position) for i in range(n)]
+
+    product = math.prod(position - j for j in range(n))
+    return [
+        (-1) ** (n - 1 - i)
+        * product
+        // ((position - i) * math.factorial(i) * math.factorial(n - 1 - i))
+        for i in range(n)
+    ]
+
+
+def extrapolate(sequences: list[list[int]], steps: int = 1) -> np.ndarray:
+    # Batch version of next_element: sequences of equal length are stacked
+    # and extrapolated together with a single matrix-vector product
+    results = np.zeros(len(sequences), dtype=object)
+
+    by_length = {}
+    for i, sequence in enumerate(sequences):
+        by_length.setdefault(len(sequence), []).append(i)
+
+    for n, indices in by_length.items():
+        weights = extrapolation_weights(n, steps)
+        rows = [[int(x) for x in sequences[i]] for i in indices]
+
+        # Largest possible magnitude of any result - if it and the weights
+        # themselves fit in int64, use NumPy, otherwise fall back to exact
+        # Python ints
+        max_value = max((abs(x) for row in rows for x in row), default=0)
+        max_weight = max((abs(w) for w in weights), default=0)
+        bound = max_value * sum(abs(w) for w in weights)
+
+        if bound < 2**63 and max_weight < 2**63:
+            values = np.array(rows, dtype=np.int64) @ np.array(weights, dtype=np.int64)
+        else:
+            values = [sum(w * x for w, x in zip(weights, row)) for row in rows]
+
+        results[indices] = [int(v) for v in values]
+
+    # Return a plain int64 array when every result fits
+    if all(-(2**63) <= v < 2**63 for v in results):
+        return results.astype(np.int64)
+    return results